@@ -4,19 +4,34 @@ A comprehensive prototype for analyzing drone-captured crop images using multipl
 Now with Hugging Face Transformers for real disease detection!
 """
 
+import functools
+import os
+import platform
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
+import torch.nn.functional as F
 import torchvision
-from torchvision import transforms
 from torchvision.models.segmentation import deeplabv3_resnet101
 from torchvision.models import resnet50, ResNet50_Weights
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle
-from PIL import Image as PILImage
 import warnings
 warnings.filterwarnings('ignore')
 
+# Fixed input shapes (512x512 segmentation, 224x224 classifier) mean
+# cuDNN's autotuned algorithm selection pays off from the first image
+torch.backends.cudnn.benchmark = True
+# Allow TF32 on Ampere+ tensor cores: 2-3x FP32 conv/matmul throughput
+# at a precision loss that is irrelevant for these vision models
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32 = True
+torch.set_float32_matmul_precision('high')
+
 # Hugging Face imports
 from transformers import AutoImageProcessor, AutoModelForImageClassification
 
@@ -28,17 +43,180 @@ except ImportError:
     YOLO_AVAILABLE = False
     print("Warning: ultralytics not available. Install with: pip install ultralytics")
 
+# Try to import numexpr for fused vegetation-index arithmetic, provide fallback
+try:
+    import numexpr as ne
+    NUMEXPR_AVAILABLE = True
+except ImportError:
+    NUMEXPR_AVAILABLE = False
+
+# Try to import TensorRT + PyCUDA for FP16 engine inference, provide fallback
+try:
+    import tensorrt as trt
+    import pycuda.driver as cuda
+    import pycuda.autoinit  # noqa: F401 - creates the CUDA context
+    TRT_AVAILABLE = True
+except ImportError:
+    TRT_AVAILABLE = False
+
+
+def build_trt_engine(onnx_path, engine_path, fp16=True):
+    """
+    Build a TensorRT engine from an ONNX file, or load it if already
+    serialized to disk. Engine files are keyed by (model, shape, precision)
+    through their filename, so rebuilds only happen once per configuration.
+    """
+    logger = trt.Logger(trt.Logger.WARNING)
+    runtime = trt.Runtime(logger)
+
+    if os.path.exists(engine_path):
+        with open(engine_path, 'rb') as f:
+            return runtime.deserialize_cuda_engine(f.read())
+
+    print(f"Building TensorRT engine from {onnx_path} (one-time)...")
+    builder = trt.Builder(logger)
+    network = builder.create_network(
+        1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH)
+    )
+    parser = trt.OnnxParser(network, logger)
+    with open(onnx_path, 'rb') as f:
+        if not parser.parse(f.read()):
+            for i in range(parser.num_errors):
+                print(parser.get_error(i))
+            raise RuntimeError(f"Failed to parse ONNX file: {onnx_path}")
+
+    config = builder.create_builder_config()
+    if fp16 and builder.platform_has_fast_fp16:
+        # FP16 on tensor cores; INT8 is skipped due to accuracy degradation
+        config.set_flag(trt.BuilderFlag.FP16)
+
+    serialized = builder.build_serialized_network(network, config)
+    if serialized is None:
+        # Raise before touching engine_path: writing first would leave a
+        # zero-byte engine that later runs deserialize to None
+        raise RuntimeError(f"TensorRT engine build failed for {onnx_path}")
+    with open(engine_path, 'wb') as f:
+        f.write(serialized)
+
+    return runtime.deserialize_cuda_engine(serialized)
+
+
+class TRTInferenceSession:
+    """
+    Wraps a TensorRT engine with pre-allocated pinned host and device
+    buffers so per-call inference is just copy-execute-copy on one stream.
+    """
+
+    def __init__(self, engine, input_shape, output_shape):
+        self.engine = engine
+        self.context = engine.create_execution_context()
+        self.stream = cuda.Stream()
+        self.output_shape = output_shape
+        # One execution context and one set of buffers: serialize callers
+        # (cached models are shared across analyzer instances)
+        self._lock = threading.Lock()
+
+        self.h_input = cuda.pagelocked_empty(trt.volume(input_shape), np.float32)
+        self.h_output = cuda.pagelocked_empty(trt.volume(output_shape), np.float32)
+        self.d_input = cuda.mem_alloc(self.h_input.nbytes)
+        self.d_output = cuda.mem_alloc(self.h_output.nbytes)
+
+        # Bind tensor addresses once; execute_async_v3 reuses them every call
+        names = [engine.get_tensor_name(i) for i in range(engine.num_io_tensors)]
+        self.context.set_tensor_address(names[0], int(self.d_input))
+        self.context.set_tensor_address(names[1], int(self.d_output))
+
+    def infer(self, image_tensor):
+        """Run one forward pass. Accepts a CPU torch tensor, returns numpy."""
+        with self._lock:
+            np.copyto(self.h_input, image_tensor.contiguous().cpu().numpy().ravel())
+            cuda.memcpy_htod_async(self.d_input, self.h_input, self.stream)
+            self.context.execute_async_v3(self.stream.handle)
+            cuda.memcpy_dtoh_async(self.h_output, self.d_output, self.stream)
+            self.stream.synchronize()
+            # Copy: the pinned output buffer is overwritten by the next call
+            return self.h_output.reshape(self.output_shape).copy()
+
+
+def quantize_model_int8(model, example_input, calibration_inputs=None):
+    """
+    Post-training static INT8 quantization via FX graph mode: ~4x smaller
+    weights and 2-4x faster conv on CPU. Graph mode is required here —
+    the ResNet/MobileNetV2 residuals use functional tensor adds, which
+    eager-mode convert() leaves with no quantized kernel. Uses FBGEMM on
+    x86 and QNNPACK on ARM. Calibration feeds representative inputs
+    through the prepared model to collect activation ranges.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    backend = 'qnnpack' if platform.machine().lower().startswith(('arm', 'aarch')) else 'fbgemm'
+    torch.backends.quantized.engine = backend
+
+    if not calibration_inputs:
+        raise ValueError(
+            "Static INT8 quantization needs representative calibration "
+            "images (50-100 frames); refusing to calibrate on random data"
+        )
+
+    model.eval()
+    prepared = prepare_fx(
+        model, get_default_qconfig_mapping(backend), (example_input,)
+    )
+
+    with torch.no_grad():
+        for calib in calibration_inputs:
+            prepared(calib)
+
+    return convert_fx(prepared)
+
+
+def load_or_script_model(model, example_input, cache_path, device='cpu'):
+    """
+    TorchScript a model via trace + optimize_for_inference (folds BN into
+    conv, strips dropout, constant-propagates). The scripted module is
+    cached on disk so subsequent runs skip the trace entirely.
+    """
+    if os.path.exists(cache_path):
+        return torch.jit.load(cache_path, map_location=device)
+    scripted = torch.jit.trace(model, example_input, strict=False)
+    scripted = torch.jit.optimize_for_inference(scripted)
+    scripted.save(cache_path)
+    return scripted
+
+
+def export_onnx_once(model, dummy_input, onnx_path):
+    """Export a model to ONNX if the file does not exist yet."""
+    if os.path.exists(onnx_path):
+        return
+    print(f"Exporting ONNX to {onnx_path} (one-time)...")
+    torch.onnx.export(
+        model, dummy_input, onnx_path,
+        input_names=['input'], output_names=['output'],
+        opset_version=13
+    )
+
 
 class ImagePreprocessor:
     """Handles image loading, resizing, and normalization."""
     
     def __init__(self, target_size=(512, 512)):
         self.target_size = target_size
-        self.normalize = transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225]
-        )
-    
+        # Reused resize output buffer: avoids one HxWx3 allocation per call.
+        # Note preprocess() returns views of this buffer; copy if you need
+        # the resized image to survive the next preprocess() call.
+        self._resize_buf = np.empty((target_size[1], target_size[0], 3), dtype=np.uint8)
+        # Normalization constants pre-broadcast for fused in-place sub/div
+        self._mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+        self._std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+        # Pinned staging tensor (CUDA only): lets .to(device, non_blocking=True)
+        # overlap the host-to-device copy with compute
+        self._pinned = None
+        if torch.cuda.is_available():
+            self._pinned = torch.empty(
+                1, 3, target_size[1], target_size[0], pin_memory=True
+            )
+
     def load_image(self, image_path):
         """Load image from file or accept numpy array."""
         if isinstance(image_path, str):
@@ -47,63 +225,201 @@ class ImagePreprocessor:
         else:
             image = image_path
         return image
-    
-    def preprocess(self, image, for_model='general'):
+
+    def preprocess(self, image):
         """
-        Preprocess image for different model types.
-        Returns both original and preprocessed versions.
+        Resize once and build the normalized model tensor from the
+        already-resized array. Returns (original, resized, tensor).
         """
         original = image.copy()
-        
-        # Resize
-        resized = cv2.resize(image, self.target_size)
-        
-        if for_model == 'tensor':
-            # Convert to tensor and normalize
-            tensor = torch.from_numpy(resized).float() / 255.0
-            tensor = tensor.permute(2, 0, 1)
-            tensor = self.normalize(tensor)
-            return original, resized, tensor.unsqueeze(0)
-        
-        return original, resized
+
+        # INTER_AREA: SIMD-optimized and higher quality than the default
+        # INTER_LINEAR for the typical large-to-small drone downscale
+        resized = cv2.resize(image, self.target_size, dst=self._resize_buf,
+                             interpolation=cv2.INTER_AREA)
+
+        # Convert to tensor and normalize in-place (single fused pass);
+        # stage through the pinned buffer when CUDA is available
+        tensor = torch.from_numpy(resized).permute(2, 0, 1).unsqueeze(0)
+        if self._pinned is not None:
+            tensor = self._pinned.copy_(tensor)
+        else:
+            tensor = tensor.float()
+        tensor = tensor.div_(255.0).sub_(self._mean).div_(self._std)
+
+        return original, resized, tensor
+
+
+class _DeepLabOutputWrapper(torch.nn.Module):
+    """Unwraps DeepLabV3's dict output so the model can be exported to ONNX."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x)['out']
 
 
 class SegmentationModel:
     """DeepLabV3 for crop/background segmentation."""
-    
-    def __init__(self, device='cpu'):
+
+    # COCO/VOC class ids treated as "plant-like" crops
+    CROP_CLASSES = (9, 10, 13, 15)
+    NUM_CLASSES = 21
+
+    def __init__(self, device='cpu', quantize_int8=False, calibration_images=None):
         self.device = device
         print("Loading DeepLabV3 segmentation model...")
         self.model = deeplabv3_resnet101(pretrained=True)
         self.model.to(device)
         self.model.eval()
-    
+
+        # Device-side lookup table for the crop-class membership test,
+        # so segment() never has to run np.isin on the host
+        self._crop_lut = torch.zeros(self.NUM_CLASSES, dtype=torch.bool, device=device)
+        self._crop_lut[list(self.CROP_CLASSES)] = True
+
+        # The model instance is cached process-wide; cudagraph-captured
+        # compiled modules replay into static buffers, so forwards from
+        # concurrent analyzers must not interleave
+        self._lock = threading.Lock()
+
+        # Static INT8 quantization on CPU (the analyzer's default device):
+        # the coarse crop/background mask tolerates the small mIoU loss
+        if quantize_int8 and device == 'cpu':
+            if not calibration_images:
+                print("Warning: quantize_int8 requested without calibration "
+                      "images; keeping FP32 (pass 50-100 representative frames)")
+            else:
+                print("Quantizing DeepLabV3 to INT8 (FX graph mode)...")
+                try:
+                    self.model = quantize_model_int8(
+                        _DeepLabOutputWrapper(self.model),
+                        torch.randn(1, 3, 512, 512),
+                        calibration_images
+                    )
+                    try:
+                        self.model = torch.jit.script(self.model)
+                    except Exception as e:
+                        print(f"Scripting quantized model failed, using eager: {e}")
+                    self.trt_session = None
+                    return
+                except Exception as e:
+                    print(f"INT8 quantization failed, using FP32 model: {e}")
+
+        # Prefer a TensorRT FP16 engine on GPU: roughly doubles conv
+        # throughput vs FP32 eager and removes Python dispatch overhead
+        self.trt_session = None
+        if TRT_AVAILABLE and device != 'cpu':
+            try:
+                # The wrapper shares the live parameters, so the export
+                # moves them to CPU; always put them back — the fallback
+                # path serves this very model on `device`
+                try:
+                    export_onnx_once(
+                        _DeepLabOutputWrapper(self.model).cpu(),
+                        torch.randn(1, 3, 512, 512),
+                        'deeplabv3_resnet101_1x3x512x512.onnx'
+                    )
+                finally:
+                    self.model.to(device)
+                engine = build_trt_engine(
+                    'deeplabv3_resnet101_1x3x512x512.onnx',
+                    'deeplabv3_resnet101_1x3x512x512_fp16.engine'
+                )
+                self.trt_session = TRTInferenceSession(
+                    engine, (1, 3, 512, 512), (1, 21, 512, 512)
+                )
+                print("✓ TensorRT FP16 engine ready for segmentation")
+            except Exception as e:
+                print(f"TensorRT engine build failed, using PyTorch: {e}")
+                self.trt_session = None
+
+        # Without TensorRT: on GPU, torch.compile with CUDA-graph capture
+        # removes per-op launch overhead (warmup is mandatory — the first
+        # calls compile and record the graph); on CPU, fall back to a
+        # scripted + inference-optimized module (20-35% latency reduction
+        # from BN folding alone)
+        if self.trt_session is None:
+            if device != 'cpu' and hasattr(torch, 'compile'):
+                try:
+                    self.model = torch.compile(
+                        self.model, mode='reduce-overhead',
+                        fullgraph=True, dynamic=False
+                    )
+                    with torch.inference_mode():
+                        for _ in range(2):
+                            self.model(torch.zeros(1, 3, 512, 512, device=device))
+                    print("✓ Segmentation model compiled (reduce-overhead)")
+                except Exception as e:
+                    print(f"torch.compile failed, using eager model: {e}")
+            else:
+                try:
+                    self.model = load_or_script_model(
+                        self.model,
+                        torch.randn(1, 3, 512, 512, device=device),
+                        'deeplabv3_resnet101_scripted.pt',
+                        device=device
+                    )
+                    print("✓ Segmentation model scripted for inference")
+                except Exception as e:
+                    print(f"TorchScript optimization failed, using eager model: {e}")
+
     def segment(self, image_tensor):
         """Segment crops from background."""
-        with torch.no_grad():
-            output = self.model(image_tensor.to(self.device))['out']
-            mask = torch.argmax(output, dim=1).squeeze().cpu().numpy()
-        
-        # Create binary mask (treating vegetation classes as crops)
-        # Classes 0-20 are COCO classes; we'll use heuristics for "plant-like"
-        crop_mask = np.isin(mask, [9, 10, 13, 15])  # Some greenery-related classes
-        
-        return mask, crop_mask.astype(np.uint8)
+        if self.trt_session is not None:
+            output = self.trt_session.infer(image_tensor)
+            mask = np.argmax(output, axis=1).squeeze()
+            crop_mask = np.isin(mask, list(self.CROP_CLASSES))
+            return mask, crop_mask.astype(np.uint8)
+
+        with self._lock, torch.inference_mode():
+            output = self.model(image_tensor.to(self.device, non_blocking=True))
+            if isinstance(output, dict):
+                output = output['out']
+
+            # Collapse logits to class ids and run the crop-class test
+            # on-device: only the small argmax + uint8 masks cross PCIe,
+            # not the full [1, 21, H, W] logits tensor
+            argmax = output.argmax(dim=1)
+            crop_mask = self._crop_lut[argmax].to(torch.uint8)
+
+        return argmax.squeeze(0).cpu().numpy(), crop_mask.squeeze(0).cpu().numpy()
+
+
+class _HFLogitsWrapper(torch.nn.Module):
+    """Unwraps the HF classifier's output object so it can be exported to ONNX."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
 
 
 class HealthClassificationModel:
     """Hugging Face transformers-based crop disease classifier."""
     
-    def __init__(self, device='cpu'):
+    def __init__(self, device='cpu', quantize_int8=False, calibration_images=None):
         self.device = device
+        # Serializes forwards on this process-wide cached instance (see
+        # SegmentationModel for the cudagraph rationale)
+        self._lock = threading.Lock()
         print("Loading Hugging Face PlantVillage Disease Model...")
         
         # Model will auto-download on first run (~90MB)
         model_name = "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification"
         
+        # FP16 weights on GPU halve bandwidth and MobileNetV2 tolerates
+        # half precision well; stay FP32 on CPU where half is slow
+        self.dtype = torch.float16 if device != 'cpu' else torch.float32
+
         try:
             self.processor = AutoImageProcessor.from_pretrained(model_name)
-            self.model = AutoModelForImageClassification.from_pretrained(model_name)
+            self.model = AutoModelForImageClassification.from_pretrained(
+                model_name, torch_dtype=self.dtype)
             self.model.to(device)
             self.model.eval()
             print("✓ Model loaded successfully")
@@ -114,7 +430,131 @@ class HealthClassificationModel:
         
         # Class names from the model
         self.classes = list(self.model.config.id2label.values())
-    
+
+        # Read the processor's statistics once so classify_health can skip
+        # the PIL round-trip and feed the model tensors directly. The input
+        # tensor is already normalized with torchvision statistics, so fold
+        # denormalize + HF renormalize into a single affine:
+        #   x_hf = ((x_tv * tv_std + tv_mean) - hf_mean) / hf_std
+        # The final model input is the center-crop size when the processor
+        # crops (e.g. shortest_edge 256 resize + 224 crop), not the resize
+        # size — matching it keeps both geometry and conv cost identical
+        # to what the checkpoint was evaluated with
+        size = getattr(self.processor, 'size', None)
+        crop_size = getattr(self.processor, 'crop_size', None)
+        if getattr(self.processor, 'do_center_crop', False) and isinstance(crop_size, dict):
+            self.input_size = (crop_size.get('height', 224), crop_size.get('width', 224))
+        elif isinstance(size, dict) and ('height' in size or 'width' in size):
+            self.input_size = (size.get('height', 224), size.get('width', 224))
+        else:
+            self.input_size = (224, 224)
+        tv_mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+        tv_std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+        hf_mean = torch.tensor(self.processor.image_mean).view(1, 3, 1, 1)
+        hf_std = torch.tensor(self.processor.image_std).view(1, 3, 1, 1)
+        self._renorm_scale = (tv_std / hf_std).to(device)
+        self._renorm_shift = ((tv_mean - hf_mean) / hf_std).to(device)
+
+        # On CPU without static INT8, dynamically quantize the classifier
+        # head: weights stored INT8, activations quantized on the fly,
+        # no calibration pass needed (dynamic conv is unsupported, so
+        # only Linear layers are converted)
+        if device == 'cpu' and not quantize_int8:
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+        # Static INT8 quantization on CPU; gains are largest here since
+        # MobileNetV2 was designed with INT8 deployment in mind
+        if quantize_int8 and device == 'cpu':
+            if not calibration_images:
+                print("Warning: quantize_int8 requested without calibration "
+                      "images; keeping FP32 (pass 50-100 representative frames)")
+            else:
+                print("Quantizing MobileNetV2 disease classifier to INT8 (FX graph mode)...")
+                try:
+                    # Calibrate on what the model actually sees: the
+                    # resized + renormalized classifier input tensors
+                    calib = [
+                        F.interpolate(t, size=self.input_size, mode='bilinear',
+                                      align_corners=False)
+                        .mul_(self._renorm_scale).add_(self._renorm_shift)
+                        for t in calibration_images
+                    ]
+                    self.scripted = quantize_model_int8(
+                        _HFLogitsWrapper(self.model),
+                        torch.randn(1, 3, *self.input_size),
+                        calib
+                    )
+                    try:
+                        self.scripted = torch.jit.script(self.scripted)
+                    except Exception as e:
+                        print(f"Scripting quantized model failed, using eager: {e}")
+                    self.trt_session = None
+                    return
+                except Exception as e:
+                    print(f"INT8 quantization failed, using FP32 model: {e}")
+                    self.scripted = None
+
+        # Prefer a TensorRT FP16 engine on GPU, as for segmentation
+        self.trt_session = None
+        if TRT_AVAILABLE and device != 'cpu':
+            try:
+                # Export in FP32; the engine build itself applies FP16.
+                # The wrapper shares the live parameters, so always restore
+                # their device and dtype — the fallback serves this model
+                try:
+                    export_onnx_once(
+                        _HFLogitsWrapper(self.model).cpu().float(),
+                        torch.randn(1, 3, 224, 224),
+                        'mobilenet_v2_plant_disease_1x3x224x224.onnx'
+                    )
+                finally:
+                    self.model.to(device, dtype=self.dtype)
+                engine = build_trt_engine(
+                    'mobilenet_v2_plant_disease_1x3x224x224.onnx',
+                    'mobilenet_v2_plant_disease_1x3x224x224_fp16.engine'
+                )
+                self.trt_session = TRTInferenceSession(
+                    engine, (1, 3, 224, 224), (1, len(self.classes))
+                )
+                print("✓ TensorRT FP16 engine ready for disease classification")
+            except Exception as e:
+                print(f"TensorRT engine build failed, using PyTorch: {e}")
+                self.trt_session = None
+
+        # Without TensorRT: torch.compile on GPU (as for segmentation),
+        # or script the logits wrapper on CPU; the wrapper keeps the
+        # scripted graph a plain tensor->tensor map
+        self.scripted = None
+        if self.trt_session is None:
+            if device != 'cpu' and hasattr(torch, 'compile'):
+                try:
+                    self.model = torch.compile(
+                        self.model, mode='reduce-overhead',
+                        fullgraph=True, dynamic=False
+                    )
+                    with torch.inference_mode():
+                        for _ in range(2):
+                            self.model(pixel_values=torch.zeros(
+                                1, 3, *self.input_size,
+                                device=device, dtype=self.dtype
+                            ))
+                    print("✓ Disease classifier compiled (reduce-overhead)")
+                except Exception as e:
+                    print(f"torch.compile failed, using eager model: {e}")
+            else:
+                try:
+                    self.scripted = load_or_script_model(
+                        _HFLogitsWrapper(self.model),
+                        torch.randn(1, 3, 224, 224, device=device),
+                        'mobilenet_v2_plant_disease_scripted.pt',
+                        device=device
+                    )
+                    print("✓ Disease classifier scripted for inference")
+                except Exception as e:
+                    print(f"TorchScript optimization failed, using eager model: {e}")
+
     def classify_health(self, image_tensor):
         """
         Classify crop disease using Hugging Face model.
@@ -126,30 +566,44 @@ class HealthClassificationModel:
             disease_name: string (specific disease)
             crop_type: string (crop name)
         """
-        # Convert tensor back to PIL Image for transformers
-        # Denormalize first
-        mean = torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1)
-        std = torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1)
-        
-        image_denorm = image_tensor.squeeze(0).cpu() * std + mean
-        image_denorm = torch.clamp(image_denorm, 0, 1)
-        image_np = (image_denorm.permute(1, 2, 0).numpy() * 255).astype(np.uint8)
-        pil_image = PILImage.fromarray(image_np)
-        
-        # Process with Hugging Face processor
-        inputs = self.processor(images=pil_image, return_tensors="pt")
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
-        
+        # Resize the already-normalized tensor directly on-device and
+        # renormalize in one fused affine; no PIL, no second processor pass
+        pixel_values = image_tensor.to(self.device, non_blocking=True)
+        pixel_values = F.interpolate(
+            pixel_values, size=self.input_size,
+            mode='bilinear', align_corners=False
+        )
+        pixel_values = pixel_values.mul_(self._renorm_scale).add_(self._renorm_shift)
+        pixel_values = pixel_values.to(self.dtype)
+
         # Get predictions
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            top_prob, top_idx = torch.max(probs, dim=1)
-        
-        # Get disease name
-        disease_full = self.model.config.id2label[top_idx.item()]
-        confidence = top_prob.item()
-        
+        if self.trt_session is not None:
+            logits = self.trt_session.infer(pixel_values)[0]
+            # Softmax on host: the output vector is tiny (~38 classes)
+            exp = np.exp(logits - logits.max())
+            probs = exp / exp.sum()
+            top_idx = int(np.argmax(probs))
+            confidence = float(probs[top_idx])
+        else:
+            with self._lock, torch.inference_mode():
+                if self.scripted is not None:
+                    logits = self.scripted(pixel_values)
+                else:
+                    logits = self.model(pixel_values=pixel_values).logits
+                # Softmax is monotonic, so argmax over raw logits picks the
+                # same class; only the winning logit needs a true probability
+                top_idx = logits.argmax(dim=-1)
+                top_logit = logits.gather(-1, top_idx.unsqueeze(-1)).squeeze(-1)
+                lse = torch.logsumexp(logits, dim=-1)
+                confidence = torch.exp(top_logit - lse).item()
+            top_idx = top_idx.item()
+
+        return self._parse_prediction(top_idx, confidence)
+
+    def _parse_prediction(self, top_idx, confidence):
+        """Turn a class index + confidence into the health tuple."""
+        disease_full = self.model.config.id2label[top_idx]
+
         # Parse disease name (format: "Crop___Disease")
         if '___' in disease_full:
             crop_type, disease_name = disease_full.split('___', 1)
@@ -158,13 +612,13 @@ class HealthClassificationModel:
         else:
             crop_type = "Unknown"
             disease_name = disease_full.replace('_', ' ')
-        
+
         # Determine health status
         if 'healthy' in disease_name.lower():
             status = "Healthy"
         else:
             status = "Diseased"
-        
+
         return status, confidence, disease_name, crop_type
 
 
@@ -174,12 +628,26 @@ class WeedPestDetector:
     def __init__(self, device='cpu'):
         self.device = device
         self.available = YOLO_AVAILABLE
-        
+        # The detector is cached process-wide and YOLO objects reuse one
+        # stateful predictor: serialize callers like the other models
+        self._lock = threading.Lock()
+
         if self.available:
             print("Loading YOLOv8 detection model...")
             try:
-                self.model = YOLO('yolov8n.pt')  # Nano model for speed
-                self.model.to(device)
+                # Prefer a TensorRT FP16 engine on GPU: NMS and decoding
+                # run inside the engine instead of the eager PyTorch path
+                if TRT_AVAILABLE and device != 'cpu':
+                    if not os.path.exists('yolov8n.engine'):
+                        print("Exporting YOLOv8 TensorRT engine (one-time)...")
+                        YOLO('yolov8n.pt').export(
+                            format='engine', half=True,
+                            dynamic=False, imgsz=512, device=0
+                        )
+                    self.model = YOLO('yolov8n.engine')
+                else:
+                    self.model = YOLO('yolov8n.pt')  # Nano model for speed
+                    self.model.to(device)
             except Exception as e:
                 print(f"YOLOv8 loading failed: {e}")
                 self.available = False
@@ -190,42 +658,74 @@ class WeedPestDetector:
             return [], "YOLOv8 not available"
         
         try:
-            results = self.model(image, verbose=False)
-            detections = []
-            
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    conf = box.conf[0].cpu().numpy()
-                    cls = int(box.cls[0].cpu().numpy())
-                    
-                    # Map detected objects to weed/pest categories
-                    # In production, use a custom-trained model
-                    label = result.names[cls]
-                    category = self._categorize_detection(label)
-                    
-                    if category:
-                        detections.append({
-                            'bbox': [int(x1), int(y1), int(x2), int(y2)],
-                            'confidence': float(conf),
-                            'label': label,
-                            'category': category
-                        })
-            
+            # Hold the lock through box readback: results reference the
+            # predictor's tensors
+            with self._lock:
+                results = self.model(image, verbose=False)
+                detections = []
+
+                for result in results:
+                    detections.extend(self._extract_detections(result))
+
             return detections, "Success"
         except Exception as e:
             return [], f"Detection failed: {str(e)}"
-    
+
+    def detect_batch(self, images):
+        """
+        Detect weeds and pests on a list of images in one call.
+        Ultralytics batches the forward pass natively.
+        Returns one detection list per input image.
+        """
+        if not self.available:
+            return [[] for _ in images], "YOLOv8 not available"
+
+        try:
+            with self._lock:
+                results = self.model(images, verbose=False)
+                return [self._extract_detections(r) for r in results], "Success"
+        except Exception as e:
+            return [[] for _ in images], f"Detection failed: {str(e)}"
+
+    def _extract_detections(self, result):
+        """Convert one YOLO result object into our detection dicts."""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return []
+
+        # One device-to-host copy per field instead of one per box
+        xyxy = boxes.xyxy.cpu().numpy()
+        confs = boxes.conf.cpu().numpy()
+        classes = boxes.cls.cpu().numpy()
+
+        detections = []
+        for (x1, y1, x2, y2), conf, cls in zip(xyxy, confs, classes):
+            # Map detected objects to weed/pest categories
+            # In production, use a custom-trained model
+            label = result.names[int(cls)]
+            category = self._categorize_detection(label)
+
+            if category:
+                detections.append({
+                    'bbox': [int(x1), int(y1), int(x2), int(y2)],
+                    'confidence': float(conf),
+                    'label': label,
+                    'category': category
+                })
+
+        return detections
+
+    # YOLO's COCO label space is fixed, so exact-match sets replace the
+    # per-call keyword substring scans
+    WEED_LABELS = frozenset({'plant', 'potted plant'})
+    PEST_LABELS = frozenset({'bird', 'insect', 'bee'})
+
     def _categorize_detection(self, label):
         """Categorize detections as weed, pest, or ignore."""
-        weed_keywords = ['plant', 'potted plant']
-        pest_keywords = ['bird', 'insect', 'bee']
-        
         label_lower = label.lower()
-        if any(kw in label_lower for kw in weed_keywords):
+        if label_lower in self.WEED_LABELS:
             return 'weed'
-        elif any(kw in label_lower for kw in pest_keywords):
+        elif label_lower in self.PEST_LABELS:
             return 'pest'
         return None
 
@@ -233,63 +733,90 @@ class WeedPestDetector:
 class VegetationIndexCalculator:
     """Calculate vegetation health indices."""
     
+    @staticmethod
+    def prepare(image):
+        """
+        Convert an HxWx3 uint8 image into contiguous float32 R, G, B
+        planes scaled to 0-1. Computing this once and passing the planes
+        to multiple index methods halves the memory traffic vs each
+        method re-casting and re-splitting the interleaved image.
+        """
+        # order='C' forces a real deinterleave: astype's default order='K'
+        # would keep the transposed strides and the planes would still
+        # walk the interleaved buffer
+        planes = image.transpose(2, 0, 1).astype(np.float32, order='C')
+        planes *= np.float32(1.0 / 255.0)
+        return planes[0], planes[1], planes[2]
+
     @staticmethod
     def excess_green_index(image):
-        """Calculate ExG (Excess Green) index."""
-        # Normalize image
-        image_norm = image.astype(np.float32) / 255.0
-        R = image_norm[:, :, 0]
-        G = image_norm[:, :, 1]
-        B = image_norm[:, :, 2]
-        
+        """
+        Calculate ExG (Excess Green) index.
+        Accepts an HxWx3 image or a prepared (R, G, B) tuple.
+        """
+        if isinstance(image, tuple):
+            R, G, B = image
+        else:
+            R, G, B = VegetationIndexCalculator.prepare(image)
+
+        if NUMEXPR_AVAILABLE:
+            # Fused multi-threaded kernels: two passes over the array
+            # instead of ~5 separate ndarray ops (memory-bound workload).
+            # eps must be float32 — a bare 1e-8 literal is float64 and
+            # would upcast the whole result
+            eps = np.float32(1e-8)
+            exg = ne.evaluate('2 * G - R - B')
+            mn, mx = np.float32(exg.min()), np.float32(exg.max())
+            return ne.evaluate('(exg - mn) / (mx - mn + eps)')
+
         # ExG = 2*G - R - B
         exg = 2 * G - R - B
-        
+
         # Normalize to 0-1
         exg_norm = (exg - exg.min()) / (exg.max() - exg.min() + 1e-8)
-        
+
         return exg_norm
-    
+
     @staticmethod
     def calculate_ndvi_approximation(image):
         """
         Approximate NDVI using visible spectrum.
         Note: True NDVI requires NIR band.
         This uses a proxy: (Green - Red) / (Green + Red)
+        Accepts an HxWx3 image or a prepared (R, G, B) tuple.
         """
-        image_norm = image.astype(np.float32) / 255.0
-        R = image_norm[:, :, 0]
-        G = image_norm[:, :, 1]
-        
+        if isinstance(image, tuple):
+            R, G, _ = image
+        else:
+            R, G, _ = VegetationIndexCalculator.prepare(image)
+
+        if NUMEXPR_AVAILABLE:
+            eps = np.float32(1e-8)  # float32: see excess_green_index
+            ndvi = ne.evaluate('(G - R) / (G + R + eps)')
+            mn, mx = np.float32(ndvi.min()), np.float32(ndvi.max())
+            return ne.evaluate('(ndvi - mn) / (mx - mn + eps)')
+
         # Pseudo-NDVI
         ndvi = (G - R) / (G + R + 1e-8)
-        
+
         # Normalize to 0-1
         ndvi_norm = (ndvi - ndvi.min()) / (ndvi.max() - ndvi.min() + 1e-8)
-        
+
         return ndvi_norm
     
-    @staticmethod
-    def create_health_map(index_array, colormap='RdYlGn'):
+    # Colormap cache: avoids the per-call registry lookup
+    _cmaps = {}
+
+    @classmethod
+    def create_health_map(cls, index_array, colormap='RdYlGn'):
         """Create color-coded health map."""
-        import tempfile
-        import os
-        
-        # Use system temp directory (cross-platform)
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, 'health_map.png')
-        
-        plt.imsave(temp_path, index_array, cmap=colormap)
-        health_map = cv2.imread(temp_path)
-        health_map = cv2.cvtColor(health_map, cv2.COLOR_BGR2RGB)
-        
-        # Clean up temp file
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-            
-        return health_map
+        # Pure in-memory colormap lookup: no temp PNG, no codecs, no disk
+        cmap = cls._cmaps.get(colormap)
+        if cmap is None:
+            cmap = cls._cmaps[colormap] = plt.get_cmap(colormap)
+
+        rgba = cmap(index_array, bytes=True)  # (H, W, 4) uint8
+        return np.ascontiguousarray(rgba[..., :3])  # already RGB
 
 
 class FusionEngine:
@@ -332,9 +859,10 @@ class FusionEngine:
             diagnosis['issues'].append(f"Crop stress detected (confidence: {health_confidence:.2%})")
             diagnosis['recommendations'].append("Check irrigation and nutrient levels")
         
-        # Rule 3: Weed/pest detection
-        weed_count = sum(1 for d in detections if d['category'] == 'weed')
-        pest_count = sum(1 for d in detections if d['category'] == 'pest')
+        # Rule 3: Weed/pest detection (single pass over detections)
+        category_counts = Counter(d['category'] for d in detections)
+        weed_count = category_counts.get('weed', 0)
+        pest_count = category_counts.get('pest', 0)
         
         if weed_count > 0:
             diagnosis['issues'].append(f"{weed_count} potential weed(s) detected")
@@ -356,53 +884,113 @@ class FusionEngine:
         return diagnosis
 
 
+@functools.lru_cache(maxsize=None)
+def get_cached_model(model_cls, device='cpu', quantize_int8=False,
+                     calibration_paths=None):
+    """
+    Process-level model cache keyed by (class, device, precision,
+    calibration set): re-creating an analyzer (e.g. per server request)
+    reuses the already loaded weights instead of paying ~2s of disk I/O
+    per restart. calibration_paths is a tuple of image paths (hashable
+    for the cache key) preprocessed here into the tensors the INT8
+    observers calibrate on.
+    """
+    if model_cls is WeedPestDetector:
+        return model_cls(device)
+
+    calibration_images = None
+    if calibration_paths:
+        preprocessor = ImagePreprocessor()
+        calibration_images = [
+            preprocessor.preprocess(preprocessor.load_image(path))[2].clone()
+            for path in calibration_paths
+        ]
+    return model_cls(device, quantize_int8=quantize_int8,
+                     calibration_images=calibration_images)
+
+
 class AgriDroneAnalyzer:
     """Main analysis pipeline integrating all components."""
-    
-    def __init__(self, device='cpu'):
+
+    # Blend color for the crop-segmentation overlay
+    _CROP_OVERLAY_COLOR = np.array([0, 255, 0], dtype=np.float32)
+
+    def __init__(self, device='cpu', quantize_int8=False,
+                 calibration_image_paths=None):
         self.device = device
         self.preprocessor = ImagePreprocessor()
-        self.segmentation_model = SegmentationModel(device)
-        self.health_classifier = HealthClassificationModel(device)
-        self.weed_pest_detector = WeedPestDetector(device)
+        # Tuple: hashable for the model cache key
+        calibration_paths = (
+            tuple(calibration_image_paths) if calibration_image_paths else None
+        )
+        self.segmentation_model = get_cached_model(
+            SegmentationModel, device, quantize_int8=quantize_int8,
+            calibration_paths=calibration_paths)
+        self.health_classifier = get_cached_model(
+            HealthClassificationModel, device, quantize_int8=quantize_int8,
+            calibration_paths=calibration_paths)
+        self.weed_pest_detector = get_cached_model(WeedPestDetector, device)
         self.vi_calculator = VegetationIndexCalculator()
         self.fusion_engine = FusionEngine()
+        # Worker threads for the data-independent model calls in analyze();
+        # the GIL is released inside the torch/OpenCV/NumPy kernels
+        self._pool = ThreadPoolExecutor(max_workers=2)
+
+    def warmup(self):
+        """
+        Run one dummy forward through each model so JIT compilation and
+        cuDNN autotuning happen before the first real image arrives.
+        """
+        print("Warming up models...")
+        dummy_tensor = torch.zeros(1, 3, 512, 512)
+        dummy_image = np.zeros((512, 512, 3), dtype=np.uint8)
+        self.segmentation_model.segment(dummy_tensor)
+        self.health_classifier.classify_health(dummy_tensor)
+        self.weed_pest_detector.detect(dummy_image)
+        print("✓ Warmup complete")
     
-    def analyze(self, image_path):
+    def analyze(self, image_path, save_visualization=False,
+                visualization_path='analysis_output.jpg'):
         """
         Complete analysis pipeline.
-        Returns all results and visualizations.
+        Returns all results; rendering is opt-in so batch callers don't
+        pay matplotlib figure costs per image.
         """
         print(f"\n{'='*60}")
         print("AGRICULTURAL DRONE IMAGE ANALYSIS")
         print(f"{'='*60}\n")
         
         # 1. Preprocessing
-        print("Step 1/6: Loading and preprocessing image...")
+        print("Step 1/4: Loading and preprocessing image...")
         image = self.preprocessor.load_image(image_path)
-        original, resized = self.preprocessor.preprocess(image)
-        _, _, image_tensor = self.preprocessor.preprocess(image, for_model='tensor')
-        
-        # 2. Segmentation
-        print("Step 2/6: Running segmentation model...")
-        seg_mask, crop_mask = self.segmentation_model.segment(image_tensor)
-        
+        original, resized, image_tensor = self.preprocessor.preprocess(image)
+        # Copy: the preprocessor reuses its resize buffer per call, and the
+        # returned results must survive the next analyze() invocation
+        resized = resized.copy()
+
+        # 2. Segmentation, detection, and vegetation index are
+        # data-independent given the preprocessed arrays: run the two
+        # model calls on worker threads and overlap them with the CPU
+        # NumPy work on this thread
+        print("Step 2/4: Running segmentation, detection and indices concurrently...")
+        seg_future = self._pool.submit(self.segmentation_model.segment, image_tensor)
+        det_future = self._pool.submit(self.weed_pest_detector.detect, resized)
+
+        # One cast/split pass shared by every index computed on this image
+        channels = self.vi_calculator.prepare(resized)
+        exg_index = self.vi_calculator.excess_green_index(channels)
+        health_map = self.vi_calculator.create_health_map(exg_index)
+
+        seg_mask, crop_mask = seg_future.result()
+        detections, det_status = det_future.result()
+        print(f"   Detection status: {det_status}")
+
         # 3. Health Classification (now with 4 return values)
-        print("Step 3/6: Classifying crop health...")
+        print("Step 3/4: Classifying crop health...")
         health_status, health_confidence, disease_name, crop_type = self.health_classifier.classify_health(image_tensor)
-        
-        # 4. Weed/Pest Detection
-        print("Step 4/6: Detecting weeds and pests...")
-        detections, det_status = self.weed_pest_detector.detect(resized)
-        print(f"   Detection status: {det_status}")
-        
-        # 5. Vegetation Index
-        print("Step 5/6: Calculating vegetation indices...")
-        exg_index = self.vi_calculator.excess_green_index(resized)
-        health_map = self.vi_calculator.create_health_map(exg_index)
-        
-        # 6. Fusion and Decision (now with disease_name and crop_type)
-        print("Step 6/6: Fusing results and generating diagnosis...")
+
+        # 4. Fusion and Decision (now with disease_name and crop_type)
+        print("Step 4/4: Fusing results and generating diagnosis...")
         diagnosis = self.fusion_engine.fuse_results(
             crop_mask, health_status, health_confidence, detections, exg_index,
             disease_name=disease_name, crop_type=crop_type
@@ -417,9 +1005,150 @@ class AgriDroneAnalyzer:
             'vegetation_index': exg_index,
             'diagnosis': diagnosis
         }
-        
+
+        if save_visualization:
+            self.save_visualization_fast(results, visualization_path)
+
         return results
-    
+
+    def save_visualization_fast(self, results, save_path='analysis_output.jpg'):
+        """
+        Lightweight OpenCV visualization: tiles the image, segmentation
+        overlay, detections, and health map into one JPEG with no
+        matplotlib figure. ~10x smaller and several times faster to
+        encode than the PNG from visualize_results, which remains the
+        detailed one-off inspection path.
+        """
+        resized = results['resized']
+
+        # Segmentation overlay: blend green into crop pixels
+        seg_img = resized.copy()
+        crop = results['segmentation_mask'].astype(bool)
+        seg_img[crop] = (seg_img[crop] * 0.5 + self._CROP_OVERLAY_COLOR * 0.5).astype(np.uint8)
+
+        # Detections: boxes always, labels only for confident ones
+        det_img = self._draw_detections(resized.copy(), results['detections'])
+
+        # Health map is already rendered in-memory by create_health_map
+        health_map = results['health_map']
+
+        tiled = np.vstack([
+            np.hstack([resized, seg_img]),
+            np.hstack([det_img, health_map])
+        ])
+        cv2.imwrite(save_path, cv2.cvtColor(tiled, cv2.COLOR_RGB2BGR),
+                    [cv2.IMWRITE_JPEG_QUALITY, 90])
+        print(f"✓ Visualization saved to: {save_path}")
+
+    # Box colors per detection category
+    _DETECTION_COLORS = {'weed': (255, 0, 0), 'pest': (255, 165, 0)}
+
+    def _draw_detections(self, det_img, detections):
+        """
+        Draw detection boxes as strided NumPy edge writes instead of one
+        cv2.rectangle call per box. Glyph rasterization (cv2.putText) is
+        slow, so labels are only drawn for confident detections.
+        """
+        h, w = det_img.shape[:2]
+        for det in detections:
+            x1, y1, x2, y2 = det['bbox']
+            x1, x2 = max(x1, 0), min(x2, w)
+            y1, y2 = max(y1, 0), min(y2, h)
+            color = self._DETECTION_COLORS.get(det['category'], (255, 165, 0))
+            det_img[y1:y1 + 2, x1:x2] = color
+            det_img[max(y2 - 2, 0):y2, x1:x2] = color
+            det_img[y1:y2, x1:x1 + 2] = color
+            det_img[y1:y2, max(x2 - 2, 0):x2] = color
+
+        for det in detections:
+            if det['confidence'] > 0.5:
+                x1, y1 = det['bbox'][:2]
+                color = self._DETECTION_COLORS.get(det['category'], (255, 165, 0))
+                cv2.putText(det_img, f"{det['category']}: {det['confidence']:.2f}",
+                            (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+        return det_img
+
+    def analyze_batch(self, image_paths, batch_size=16):
+        """
+        Analyze many images (e.g. one drone flight) with batched forward
+        passes: each model sees a [B, 3, H, W] tensor once per chunk
+        instead of B separate calls. Returns one result dict per image.
+        """
+        use_cuda = self.device != 'cpu' and torch.cuda.is_available()
+        all_results = []
+
+        for start in range(0, len(image_paths), batch_size):
+            chunk = image_paths[start:start + batch_size]
+            print(f"Analyzing images {start + 1}-{start + len(chunk)} of {len(image_paths)}...")
+
+            # Preprocess the chunk into one (optionally pinned) batch tensor
+            originals = []
+            resized_images = []
+            batch = torch.empty(len(chunk), 3, 512, 512, pin_memory=use_cuda)
+            for i, path in enumerate(chunk):
+                image = self.preprocessor.load_image(path)
+                original, resized, tensor = self.preprocessor.preprocess(image)
+                originals.append(original)
+                # Copy: the preprocessor reuses its resize buffer per call
+                resized_images.append(resized.copy())
+                batch[i].copy_(tensor.squeeze(0))
+            batch = batch.to(self.device, non_blocking=True)
+
+            with torch.inference_mode():
+                # Segmentation: one forward for the whole chunk. Hold the
+                # model lock until the outputs are read back — the cached
+                # instance (and any cudagraph static buffers) is shared
+                with self.segmentation_model._lock:
+                    seg_out = self.segmentation_model.model(batch)
+                    if isinstance(seg_out, dict):
+                        seg_out = seg_out['out']
+                    seg_masks = seg_out.argmax(dim=1).cpu().numpy()
+                crop_masks = np.isin(seg_masks, list(SegmentationModel.CROP_CLASSES)).astype(np.uint8)
+
+                # Health classification: one forward for the whole chunk
+                clf = self.health_classifier
+                batch_224 = F.interpolate(
+                    batch, size=clf.input_size,
+                    mode='bilinear', align_corners=False
+                )
+                batch_224 = batch_224.mul_(clf._renorm_scale).add_(clf._renorm_shift)
+                batch_224 = batch_224.to(clf.dtype)
+                with clf._lock:
+                    if clf.scripted is not None:
+                        logits = clf.scripted(batch_224)
+                    else:
+                        logits = clf.model(pixel_values=batch_224).logits
+                    probs = torch.nn.functional.softmax(logits, dim=-1)
+                    top_probs, top_idxs = torch.max(probs, dim=1)
+
+            # Detection: Ultralytics batches the list natively
+            detections_per_image, _ = self.weed_pest_detector.detect_batch(resized_images)
+
+            for i, resized in enumerate(resized_images):
+                health = clf._parse_prediction(top_idxs[i].item(), top_probs[i].item())
+                health_status, health_confidence, disease_name, crop_type = health
+
+                exg_index = self.vi_calculator.excess_green_index(resized)
+                health_map = self.vi_calculator.create_health_map(exg_index)
+                diagnosis = self.fusion_engine.fuse_results(
+                    crop_masks[i], health_status, health_confidence,
+                    detections_per_image[i], exg_index,
+                    disease_name=disease_name, crop_type=crop_type
+                )
+
+                all_results.append({
+                    'original': originals[i],
+                    'resized': resized,
+                    'segmentation_mask': crop_masks[i],
+                    'detections': detections_per_image[i],
+                    'health_map': health_map,
+                    'vegetation_index': exg_index,
+                    'diagnosis': diagnosis
+                })
+
+        return all_results
+
     def visualize_results(self, results, save_path='analysis_output.png'):
         """Create comprehensive visualization of all results."""
         fig = plt.figure(figsize=(20, 12))
@@ -439,14 +1168,7 @@ class AgriDroneAnalyzer:
         
         # 3. Detection Results
         ax3 = plt.subplot(2, 3, 3)
-        det_img = results['resized'].copy()
-        for det in results['detections']:
-            x1, y1, x2, y2 = det['bbox']
-            color = (255, 0, 0) if det['category'] == 'weed' else (255, 165, 0)
-            cv2.rectangle(det_img, (x1, y1), (x2, y2), color, 2)
-            label = f"{det['category']}: {det['confidence']:.2f}"
-            cv2.putText(det_img, label, (x1, y1-5), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        det_img = self._draw_detections(results['resized'].copy(), results['detections'])
         ax3.imshow(det_img)
         ax3.set_title(f'Weed/Pest Detection ({len(results["detections"])} found)', 
                      fontsize=14, fontweight='bold')